@@ -1,36 +1,85 @@
 from distributed_log import storage
 from distributed_log.network import Server
+from distributed_log.network import RttEstimator
+from distributed_log.fault_injection import FaultInjector
+from distributed_log.fault_injection import FaultRule
+from distributed_log.tracing import Trace
+from distributed_log.tracing import Tracer
+from distributed_log.tracing import span
 from distributed_log.setup_logger import logger
 from threading import Condition
 from threading import Timer
 from threading import Thread
+from typing import Callable
 from typing import Optional
+import asyncio
 import multiprocessing
+import math
+import re
+import random
+import time
 import yaml
 import os
 import json
 import requests
 import queue
+import zlib
 
 
 class DataManagerReadonlyModeException(Exception):
     pass
 
 
+class DataManagerInvalidLogNameException(Exception):
+    pass
+
+
+class DataManagerReadTimeoutException(Exception):
+    pass
+
+
+class DataManagerSecondaryExistsException(Exception):
+    pass
+
+
+class DataManagerSecondaryNotFoundException(Exception):
+    pass
+
+
+class DataManagerValueTooLargeException(Exception):
+    pass
+
+
+class DataManagerBackpressureException(Exception):
+    """
+    Raised when a new value can't be accepted because too many values are not replicated yet
+    """
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
 class CountDownLatch:
     def __init__(self, count):
         self.count = count
         self.condition = Condition()
 
-    def count_down(self):
+    def count_down(self) -> bool:
+        """
+        Returns True only for the call that released the latch
+        """
         with self.condition:
             if self.count == 0:
-                return
+                return False
 
             self.count -= 1
 
             if self.count == 0:
                 self.condition.notify_all()
+                return True
+
+            return False
 
     def wait(self):
         with self.condition:
@@ -56,32 +105,58 @@ class RepeatTimer(Timer):
 class DataManager:
     """
     Responsible for all data processing, represents a thread-safe singleton and supports next features:
+     - operating with named logs (partitions) - every log has its own storage, lock and index sequence
      - operating with provided storage - creating/saving/getting data from storage
      - can work both in Master and Secondary mode
      - contains information about secondaries and managing the replication process
+     - secondaries can be added at runtime: a new secondary receives live replication right away, gets existing
+       data as a snapshot and becomes a member (counted for write concern and quorum) when it has caught up
     """
     MODE_MASTER = 'master'
     MODE_SECONDARY = 'secondary'
 
+    DEFAULT_LOG = 'default'
+
     __QUEUE_ITEM_NODE_STATUS_CHANGED = 'node_status_changed'
 
     __is_new = True
     __instance = None
     __lock = multiprocessing.Lock()
-    __storage: storage.DataStorageInterface
+    __storage_factory: Callable[[], storage.DataStorageInterface]
+    __logs: dict[str, storage.DataStorageInterface] = {}
+    __logs_lock = multiprocessing.Lock()
+    __max_logs: int = None
+    __max_read_wait = 10
+    __read_wait_poll_interval = 0.01
     __mode: str
     __app_name: str
     __quorum_size: int = None
     __readonly = False
     __nodes: dict[str, Server, ] = {}
+    __joining: dict[str, Server, ] = {}
+    __added_at_runtime: set[str] = set()
     __heartbeat_interval = 1
-    __heartbeat_threads = []
+    __heartbeat_threads: dict[str, RepeatTimer] = {}
     __system_queue = queue.Queue()
-
-    def __new__(cls, mode: str, storage_object: storage.DataStorageInterface, app_name: str, config: dict):
+    __admission_lock = multiprocessing.Lock()
+    __max_inflight_entries: int = None
+    __max_inflight_entries_per_secondary: int = None
+    __max_inflight_bytes_per_secondary: int = None
+    __max_retry_after = 30
+    __inflight_entries = 0
+    __retry_backoff_base = 0.05
+    __retry_backoff_cap = 30
+    __replication_timeouts = (1, 0.1, 5)
+    __snapshot_chunk_size = 1000
+    __snapshot_request_timeout = 30
+    __bootstrap_max_lag = 10
+    __bootstrap_timeout = 600
+
+    def __new__(cls, mode: str, storage_factory: Callable[[], storage.DataStorageInterface], app_name: str,
+                config: dict):
         """
         :param mode: Master or Secondary
-        :param storage_object: storage object that implements DataStorageInterface
+        :param storage_factory: creates storage object that implements DataStorageInterface for every log
         :param app_name: Application name - used for logging
         """
         if not cls.__instance:
@@ -90,10 +165,11 @@ class DataManager:
                     cls.__instance = super(DataManager, cls).__new__(cls)
         return cls.__instance
 
-    def __init__(self, mode: str, storage_object: storage.DataStorageInterface, app_name: str, config: dict):
+    def __init__(self, mode: str, storage_factory: Callable[[], storage.DataStorageInterface], app_name: str,
+                 config: dict):
         """
         :param mode: Master or Secondary
-        :param storage_object: storage object that implements DataStorageInterface
+        :param storage_factory: creates storage object that implements DataStorageInterface for every log
         :param app_name: Application name - used for logging
         :param config: application config, contains information about secondaries and quorum size
         """
@@ -108,14 +184,28 @@ class DataManager:
             raise Exception("Unsupported mode " + mode)
 
         self.__mode = mode
-        self.__storage = storage_object
+        self.__storage_factory = storage_factory
         self.__app_name = app_name
+        self.__max_logs = config.get('max_logs')
+        self.__get_log(self.DEFAULT_LOG)
+
+        if 'max_read_wait_seconds' in config:
+            self.__max_read_wait = config['max_read_wait_seconds']
+
+        if 'read_wait_poll_interval_seconds' in config:
+            self.__read_wait_poll_interval = config['read_wait_poll_interval_seconds']
 
         if self.is_master():
+            self.__replication_timeouts = (
+                config.get('replication_timeout_initial_seconds', 1),
+                config.get('replication_timeout_min_seconds', 0.1),
+                config.get('replication_timeout_max_seconds', 5),
+            )
+
             secondaries = {} if 'secondaries' not in config else config['secondaries']
 
             for secondary_name, secondary_address in secondaries.items():
-                self.__nodes[secondary_name] = Server(secondary_address, Server.MODE_SECONDARY)
+                self.__nodes[secondary_name] = self.__create_server(secondary_address)
 
             if 'quorum' in config:
                 self.__quorum_size = config['quorum']
@@ -123,6 +213,39 @@ class DataManager:
             if 'heartbeat_interval_seconds' in config:
                 self.__heartbeat_interval = config['heartbeat_interval_seconds']
 
+            self.__max_inflight_entries = config.get('max_inflight_entries')
+            self.__max_inflight_entries_per_secondary = config.get('max_inflight_entries_per_secondary')
+            self.__max_inflight_bytes_per_secondary = config.get('max_inflight_bytes_per_secondary')
+
+            if 'max_retry_after_seconds' in config:
+                self.__max_retry_after = config['max_retry_after_seconds']
+
+            if 'retry_backoff_base_seconds' in config:
+                self.__retry_backoff_base = config['retry_backoff_base_seconds']
+
+            if 'retry_backoff_cap_seconds' in config:
+                self.__retry_backoff_cap = config['retry_backoff_cap_seconds']
+
+            if 'snapshot_chunk_size' in config:
+                self.__snapshot_chunk_size = config['snapshot_chunk_size']
+
+            if 'snapshot_request_timeout_seconds' in config:
+                self.__snapshot_request_timeout = config['snapshot_request_timeout_seconds']
+
+            if 'bootstrap_max_lag' in config:
+                self.__bootstrap_max_lag = config['bootstrap_max_lag']
+
+            if 'bootstrap_timeout_seconds' in config:
+                self.__bootstrap_timeout = config['bootstrap_timeout_seconds']
+
+        if 'traces_buffer_size' in config:
+            Tracer().set_buffer_size(config['traces_buffer_size'])
+
+        Tracer().set_enabled(config.get('tracing_enabled', False))
+
+        if 'fault_drop_hold_seconds' in config:
+            FaultInjector().set_drop_hold_seconds(config['fault_drop_hold_seconds'])
+
     def startup(self):
         self.__log(' node startup')
         self.__start_heartbeat()
@@ -176,24 +299,402 @@ class DataManager:
                     self.__log('Node switched to normal mode')
                 self.__readonly = False
 
-    def get_values(self) -> list[str]:
+    def __create_server(self, address: str) -> Server:
+        return Server(address, Server.MODE_SECONDARY, rtt_estimator=RttEstimator(*self.__replication_timeouts))
+
+    def __get_nodes_snapshot(self) -> tuple[dict[str, Server], dict[str, Server]]:
+        """
+        Returns copies of members and joining secondaries taken at the same moment
+        """
+        with self.__lock:
+            return dict(self.__nodes), dict(self.__joining)
+
+    def get_secondaries(self) -> dict:
+        members, joining = self.__get_nodes_snapshot()
+        secondaries = {}
+
+        for secondary_name, secondary in {**members, **joining}.items():
+            secondaries[secondary_name] = {
+                'dsn': secondary.get_dsn(),
+                'status': secondary.get_status(),
+                'state': 'member' if secondary_name in members else 'joining',
+            }
+
+        return secondaries
+
+    def add_secondary(self, name: str, address: str) -> None:
+        """
+        Registers a new secondary at runtime, works only in Master mode
+        The secondary starts receiving new values immediately, existing values are streamed as a snapshot
+        in background, and it becomes a member when it's healthy and its lag reported with heartbeats
+        is not greater than bootstrap_max_lag
+        The secondary is removed if it doesn't become a member during bootstrap_timeout_seconds
+        """
+        if not self.is_master():
+            msg = 'Adding secondaries allowed only in Master mode'
+            self.__log(msg, level='error')
+            raise Exception(msg)
+
+        server = self.__create_server(address)
+
+        with self.__lock:
+            if name in self.__nodes or name in self.__joining:
+                raise DataManagerSecondaryExistsException(f'Secondary `{name}` already exists')
+
+            self.__joining[name] = server
+            self.__added_at_runtime.add(name)
+
+        self.__log(f'secondary `{name}` ({address}) is joining')
+        self.__start_node_heartbeat(name, server)
+
+        thread = Thread(target=self.__bootstrap_secondary, args=(name, server, True), daemon=True)
+        thread.start()
+
+    def remove_secondary(self, name: str) -> None:
+        """
+        Removes a joining secondary or a member added at runtime, members from config can't be removed
+        Pending replication and bootstrap of the secondary are cancelled,
+        writes waiting for its acknowledgment are not blocked by it anymore
+        """
+        with self.__lock:
+            if name not in self.__added_at_runtime:
+                raise DataManagerSecondaryNotFoundException(f'Secondary `{name}` is not added at runtime')
+
+            is_member = name in self.__nodes
+            server = self.__nodes.pop(name) if is_member else self.__joining.pop(name)
+            self.__added_at_runtime.remove(name)
+
+        self.__retire_secondary(name, server)
+
+        if is_member:
+            self.__fire_node_status_changed_event()
+
+    def __abort_join(self, name: str, server: Server, reason: str) -> None:
+        with self.__lock:
+            if self.__joining.get(name) is not server:
+                return  # already removed or joined
+
+            del self.__joining[name]
+            self.__added_at_runtime.discard(name)
+
+        self.__log(f'joining of `{name}` is aborted: {reason}', level='warning')
+        self.__retire_secondary(name, server)
+
+    def __retire_secondary(self, name: str, server: Server) -> None:
+        server.retire()
+
+        thread = self.__heartbeat_threads.pop(name, None)
+
+        if thread is not None:
+            thread.cancel()
+
+        self.__log(f'secondary `{name}` is removed')
+
+    def bootstrap_secondary(self, name: str) -> None:
+        """
+        Streams the snapshot to an existing member again, e.g. when the node was replaced and lost its data
+        """
+        server = self.__get_nodes_snapshot()[0].get(name)
+
+        if server is None:
+            raise DataManagerSecondaryNotFoundException(f'Secondary `{name}` is not a member')
+
+        thread = Thread(target=self.__bootstrap_secondary, args=(name, server, False), daemon=True)
+        thread.start()
+
+    def __bootstrap_secondary(self, name: str, server: Server, join: bool) -> None:
+        self.__log(f'bootstrap of `{name}` started')
+        deadline = time.monotonic() + self.__bootstrap_timeout
+
+        for log_name in self.get_log_names():
+            log_storage = self.__get_log(log_name, create=False)
+            # all values after this index are sent to the secondary by the live replication
+            snapshot_index = log_storage.get_last_index()
+
+            if not self.__send_snapshot(name, server, log_name, log_storage, snapshot_index, deadline):
+                self.__abort_bootstrap(name, server, join)
+                return
+
+        self.__log(f'snapshot is sent to `{name}`')
+
+        if not join:
+            return
+
+        if not self.__wait_until_caught_up(server, deadline):
+            self.__abort_bootstrap(name, server, join)
+            return
+
+        with self.__lock:
+            if self.__joining.get(name) is not server:
+                return  # removed while catching up
+
+            self.__nodes[name] = self.__joining.pop(name)
+
+        self.__log(f'secondary `{name}` joined the cluster')
+        self.__fire_node_status_changed_event()
+
+    def __abort_bootstrap(self, name: str, server: Server, join: bool) -> None:
+        if server.is_retired():
+            return
+
+        reason = f'bootstrap is not finished in {self.__bootstrap_timeout} seconds'
+
+        if join:
+            self.__abort_join(name, server, reason)
+        else:
+            self.__log(f'bootstrap of `{name}` is aborted: {reason}', level='warning')
+
+    def __wait_until_caught_up(self, server: Server, deadline: float) -> bool:
+        """
+        Waits until the server is healthy and its lag reported with heartbeats is not greater than bootstrap_max_lag,
+        so a server that was never reached doesn't become a member even if the logs are almost empty
+        Returns False if the server was removed or has not caught up before the deadline
+        """
+        while not server.is_retired() and time.monotonic() < deadline:
+            if server.is_healthy() and server.has_reported_applied_index():
+                lag = 0
+
+                for log_name in self.get_log_names():
+                    last_index = self.__get_log(log_name, create=False).get_last_index()
+                    lag = max(lag, last_index - server.get_applied_index(log_name))
+
+                if lag <= self.__bootstrap_max_lag:
+                    return True
+
+            time.sleep(self.__heartbeat_interval)
+
+        return False
+
+    def __get_log(self, name: str, create: bool = True) -> Optional[storage.DataStorageInterface]:
         """
-        Returns all stored and committed items up to first uncommitted one
+        Returns storage of the log with provided name, the log is created on the first write
         """
-        items = self.__storage.get_list()
-        self.__log(f'get values request, returned items: {json.dumps(items)}')
+        log_storage = self.__logs.get(name)
+
+        if log_storage is not None or not create:
+            return log_storage
+
+        self.__validate_log_name(name)
+
+        with self.__logs_lock:
+            if name not in self.__logs:
+                if self.__max_logs is not None and len(self.__logs) >= self.__max_logs:
+                    raise DataManagerInvalidLogNameException(f'Log `{name}` can\'t be created, too many logs')
+
+                self.__logs[name] = self.__storage_factory()
+                self.__log(f'log `{name}` is created')
+
+            return self.__logs[name]
+
+    @staticmethod
+    def __validate_log_name(name: str) -> None:
+        if not re.fullmatch(r'[A-Za-z0-9_-]{1,64}', name):
+            raise DataManagerInvalidLogNameException(f'Log name `{name}` is incorrect')
+
+    def get_log_names(self) -> list[str]:
+        return list(self.__logs.keys())
+
+    @classmethod
+    def get_log_path(cls, log_name: str, path: str) -> str:
+        """
+        Returns endpoint path for the provided log, the default log uses root endpoints
+        """
+        if log_name == cls.DEFAULT_LOG:
+            return path
+
+        return f'/logs/{log_name}{path}'
+
+    def get_values(self, log_name: str = DEFAULT_LOG) -> list[str]:
+        """
+        Returns all stored and committed items of the log up to first uncommitted one
+        """
+        trace = Tracer().start_trace('get_values', log=log_name)
+
+        try:
+            log_storage = self.__get_log(log_name, create=False)
+
+            with span(trace, 'storage.get_list'):
+                items = log_storage.get_list() if log_storage is not None else []
+        finally:
+            Tracer().finish_trace(trace)
+
+        self.__log(f'get values request ({log_name}), returned items: {json.dumps(items)}')
 
         return items
 
-    def get_heartbeat_status(self) -> str:
+    async def wait_for_index(self, log_name: str, min_index: int, timeout: Optional[float] = None) -> None:
+        """
+        Waits until the consistent prefix of the log reaches provided index, the log is not created if it's absent
+        The waiting is done on the event loop by polling, so it doesn't hold worker threads needed for replication
+        The waiting time is bounded with max_read_wait_seconds config parameter
+        Raises DataManagerReadTimeoutException if the index was not reached
+        """
+        self.__validate_log_name(log_name)
+
+        timeout = self.__max_read_wait if timeout is None else max(0, min(timeout, self.__max_read_wait))
+        deadline = time.monotonic() + timeout
+
+        while self.get_consistent_index(log_name) < min_index:
+            if time.monotonic() >= deadline:
+                raise DataManagerReadTimeoutException(
+                    f'Log `{log_name}` has not reached index {min_index}, '
+                    f'current index is {self.get_consistent_index(log_name)}'
+                )
+
+            await asyncio.sleep(self.__read_wait_poll_interval)
+
+    def get_consistent_index(self, log_name: str = DEFAULT_LOG) -> int:
+        log_storage = self.__get_log(log_name, create=False)
+
+        return log_storage.get_consistent_index() if log_storage is not None else 0
+
+    def get_replicas_lag(self, log_name: str = DEFAULT_LOG) -> dict:
+        """
+        Returns consistent index of the log reported by every secondary with heartbeats and its lag behind the Master
+        Both values are None until the secondary responds to the first heartbeat
+        """
+        log_storage = self.__get_log(log_name, create=False)
+        last_index = log_storage.get_last_index() if log_storage is not None else 0
+        members, joining = self.__get_nodes_snapshot()
+        secondaries = {}
+
+        for secondary_name, secondary in {**members, **joining}.items():
+            applied_index = secondary.get_applied_index(log_name)
+            secondaries[secondary_name] = {
+                'dsn': secondary.get_dsn(),
+                'status': secondary.get_status(),
+                'member': secondary_name in members,
+                'applied_index': applied_index,
+                'lag': max(0, last_index - applied_index) if applied_index is not None else None,
+            }
+
+        return {
+            'last_index': last_index,
+            'consistent_index': self.get_consistent_index(log_name),
+            'secondaries': secondaries,
+        }
+
+    def get_heartbeat_status(self) -> dict:
+        """
+        Returns heartbeat status with consistent index of every log, the Master uses it to calculate the lag
+        """
+
+        return {
+            'status': 'Alive',
+            'logs': {log_name: self.get_consistent_index(log_name) for log_name in self.get_log_names()},
+        }
+
+    def get_replication_status(self) -> dict:
+        """
+        Returns replication queue depth in total and for every secondary
+        """
+        members, joining = self.__get_nodes_snapshot()
+        secondaries = {}
+
+        for secondary_name, secondary in {**members, **joining}.items():
+            secondaries[secondary_name] = {
+                'status': secondary.get_status(),
+                'member': secondary_name in members,
+                'inflight_entries': secondary.get_inflight_entries(),
+                'inflight_bytes': secondary.get_inflight_bytes(),
+                'drain_rate': secondary.get_drain_rate(),
+                'srtt': secondary.get_srtt(),
+                'rttvar': secondary.get_rttvar(),
+                'request_timeout': secondary.get_request_timeout(),
+            }
+
+        return {
+            'inflight_entries': self.__inflight_entries,
+            'max_inflight_entries': self.__max_inflight_entries,
+            'max_inflight_entries_per_secondary': self.__max_inflight_entries_per_secondary,
+            'max_inflight_bytes_per_secondary': self.__max_inflight_bytes_per_secondary,
+            'secondaries': secondaries,
+            'logs': {log_name: self.get_replicas_lag(log_name) for log_name in self.get_log_names()},
+        }
+
+    def __get_retry_after(self, overflow_entries: int, drain_rate: float) -> int:
+        if drain_rate <= 0:
+            return self.__max_retry_after
+
+        return max(1, min(self.__max_retry_after, math.ceil(overflow_entries / drain_rate)))
+
+    def __admit_or_raise_exception(self, size: int, targets: dict[str, Server]) -> None:
+        """
+        Reserves replication capacity for a new value of the provided size on every target secondary
+        Raises DataManagerBackpressureException if any of the in-flight limits would be exceeded
+        """
+        with self.__admission_lock:
+            retry_after = 0
+
+            if self.__max_inflight_entries is not None and self.__inflight_entries + 1 > self.__max_inflight_entries:
+                # values leave the global queue when the slowest secondary acknowledges them
+                drain_rate = min([secondary.get_drain_rate() for secondary in targets.values()], default=0)
+                overflow = self.__inflight_entries + 1 - self.__max_inflight_entries
+                retry_after = self.__get_retry_after(overflow, drain_rate)
+
+            for secondary_name, secondary in targets.items():
+                if secondary.can_accept(size, self.__max_inflight_entries_per_secondary,
+                                        self.__max_inflight_bytes_per_secondary):
+                    continue
+
+                overflow = 1
+
+                if self.__max_inflight_entries_per_secondary is not None:
+                    overflow = max(
+                        overflow,
+                        secondary.get_inflight_entries() + 1 - self.__max_inflight_entries_per_secondary
+                    )
+
+                if self.__max_inflight_bytes_per_secondary is not None and secondary.get_inflight_entries() > 0:
+                    average_size = secondary.get_inflight_bytes() / secondary.get_inflight_entries()
+                    overflow_bytes = secondary.get_inflight_bytes() + size - self.__max_inflight_bytes_per_secondary
+                    overflow = max(overflow, math.ceil(overflow_bytes / max(average_size, 1)))
+
+                retry_after = max(retry_after, self.__get_retry_after(overflow, secondary.get_drain_rate()))
+                self.__log(f'replication queue for {secondary_name} is full', level='warning')
+
+            if retry_after > 0:
+                raise DataManagerBackpressureException('Too many values are not replicated yet', retry_after)
+
+            for secondary in targets.values():
+                secondary.replication_started(size)
+
+            if targets:
+                self.__inflight_entries += 1
+
+    def __reserve_joining_capacity(self, size: int, joining: dict[str, Server]) -> list[str]:
+        """
+        Reserves replication capacity for a new value on joining secondaries, they have the same per-secondary limits
+        as members, but don't block writes: names of secondaries over the limits are returned instead
+        """
+        overflowed = []
+
+        with self.__admission_lock:
+            for secondary_name, secondary in joining.items():
+                if secondary.can_accept(size, self.__max_inflight_entries_per_secondary,
+                                        self.__max_inflight_bytes_per_secondary):
+                    secondary.replication_started(size)
+                else:
+                    overflowed.append(secondary_name)
+
+        return overflowed
+
+    def __release_inflight_entry(self) -> None:
+        with self.__admission_lock:
+            self.__inflight_entries -= 1
+
+    def __cancel_reservation(self, size: int, reserved: dict[str, Server]) -> None:
         """
-        Returns dummy heartbeat status from server. Can be replaced with some "smart" value
+        Releases capacity reserved by admission for a value that will not be replicated
         """
+        for secondary in reserved.values():
+            secondary.replication_cancelled(size)
 
-        return 'Alive'
+        if reserved:
+            self.__release_inflight_entry()
 
-    def __get_write_concern_or_raise_exception(self, write_concern: Optional[int] = None) -> int:
-        write_concern_all = len(self.__nodes.items()) + 1
+    def __get_write_concern_or_raise_exception(self, members_count: int, write_concern: Optional[int] = None) -> int:
+        write_concern_all = members_count + 1
 
         if write_concern is None:
             write_concern = write_concern_all  # by default use WC=ALL
@@ -205,9 +706,10 @@ class DataManager:
 
         return write_concern
 
-    def add_value(self, value: str, write_concern: Optional[int] = None) -> bool:
+    def add_value(self, value: str, write_concern: Optional[int] = None, log_name: str = DEFAULT_LOG) -> int:
         """
-        Add new value to the storage and replicate this across all secondaries
+        Add new value to the log storage and replicate this across all secondaries
+        Returns the key of the stored value
         Works only in Master mode
         """
         if not self.is_master():
@@ -218,41 +720,100 @@ class DataManager:
         if self.__readonly:
             raise DataManagerReadonlyModeException('Master is in read-only mode now')
 
-        write_concern = self.__get_write_concern_or_raise_exception(write_concern)
+        # write concern and reserved capacity are based on the same membership snapshot
+        # joining secondaries are not limited by admission, so a node that never comes up doesn't block writes
+        members = self.__get_nodes_snapshot()[0]
+        reserved = members
+        write_concern = self.__get_write_concern_or_raise_exception(len(members), write_concern)
+        self.__validate_log_name(log_name)
+
+        size = len(value.encode())
+
+        if self.__max_inflight_bytes_per_secondary is not None and size > self.__max_inflight_bytes_per_secondary:
+            # such value never fits into the replication queue, so retrying it later doesn't help
+            raise DataManagerValueTooLargeException(
+                f'Value size {size} exceeds max_inflight_bytes_per_secondary {self.__max_inflight_bytes_per_secondary}'
+            )
 
-        self.__log(f'adding value: {value} with WC = {write_concern}')
+        self.__admit_or_raise_exception(size, reserved)
 
-        key = self.__storage.add_value(value)
-        self.__log(f'value `{value}`, key = {key} is stored ')
+        try:
+            # the log is created only for admitted writes, so rejected ones don't take log slots
+            log_storage = self.__get_log(log_name)
+        except BaseException:
+            self.__cancel_reservation(size, reserved)
+            raise
 
-        # on this iteration consider that data will be successfully replicated
-        self.__replicate_stored_value(key, write_concern)
+        self.__log(f'adding value: {value} to log `{log_name}` with WC = {write_concern}')
 
-        # commit the value on master when it was fully replicated
-        self.__storage.commit_value(key)
-        self.__log(f'committed value `{value}`, key = {key}, WC = {write_concern}')
+        trace = Tracer().start_trace('add_value', log=log_name, write_concern=write_concern)
 
-        return True
+        try:
+            try:
+                with span(trace, 'storage.add_value') as attributes:
+                    key = log_storage.add_value(value)
+                    attributes['key'] = key
+            except BaseException:
+                self.__cancel_reservation(size, reserved)
+                raise
+
+            self.__log(f'value `{value}`, log = {log_name}, key = {key} is stored ')
+
+            # on this iteration consider that data will be successfully replicated
+            self.__replicate_stored_value(log_name, key, value, write_concern, reserved, trace)
+
+            # commit the value on master when it was fully replicated
+            with span(trace, 'storage.commit_value'):
+                log_storage.commit_value(key)
+
+            self.__log(f'committed value `{value}`, log = {log_name}, key = {key}, WC = {write_concern}')
+        finally:
+            Tracer().finish_trace(trace)
+
+        return key
 
-    def set_value(self, key: int, value: str) -> bool:
+    def set_value(self, key: int, value: str, log_name: str = DEFAULT_LOG) -> bool:
         """
-        Save and commit value into storage with provided key
+        Save and commit value into the log storage with provided key
         Returns False if value is already present in the storage and True in case of success
         Works only in Secondary mode
         """
-        self.__log(f'storing value with key = {key}, value = {value}')
+        self.__log(f'storing value with log = {log_name}, key = {key}, value = {value}')
 
         if not self.is_secondary():
             msg = 'Setting values allowed only in Secondary mode'
             self.__log(msg, level='error')
             raise Exception(msg)
 
-        stored = self.__storage.set_value(key, value)
+        stored = self.__get_log(log_name).set_value(key, value)
 
         if stored:
-            self.__log(f'value ({key} = {value}) successfully stored')
+            self.__log(f'value ({log_name}: {key} = {value}) successfully stored')
         else:
-            self.__log(f'key `{key}` is already exist')
+            self.__log(f'key `{key}` is already exist in log `{log_name}`')
+
+        return stored
+
+    def apply_snapshot(self, payload: bytes, log_name: str = DEFAULT_LOG) -> int:
+        """
+        Saves and commits values from the snapshot chunk, the chunk is zlib-compressed JSON list of [key, value] pairs
+        Returns the number of stored values, already present keys are skipped
+        Works only in Secondary mode
+        """
+        if not self.is_secondary():
+            msg = 'Applying snapshots allowed only in Secondary mode'
+            self.__log(msg, level='error')
+            raise Exception(msg)
+
+        log_storage = self.__get_log(log_name)
+        items = json.loads(zlib.decompress(payload))
+        stored = 0
+
+        for key, value in items:
+            if log_storage.set_value(key, value):
+                stored += 1
+
+        self.__log(f'snapshot chunk for log `{log_name}` is applied: {stored} of {len(items)} values stored')
 
         return stored
 
@@ -270,63 +831,136 @@ class DataManager:
     def is_secondary(self) -> bool:
         return self.MODE_SECONDARY == self.__mode
 
-    def __replicate_stored_value(self, key: int, write_concern: int) -> None:
-        value = self.__storage.get_value(key)
-
-        if value is None:
-            raise Exception("There is no value stored for key=" + str(key))
-
+    def __replicate_stored_value(self, log_name: str, key: int, value: str, write_concern: int,
+                                 reserved: dict[str, Server], trace: Optional[Trace] = None) -> None:
+        """
+        Sends the value to all members and joining secondaries, only members' acknowledgments count for write concern
+        The targets are taken after the value is stored, so a secondary that started joining later
+        gets this value with the snapshot
+        Joining of a secondary is aborted when its replication queue is over the per-secondary limits,
+        so a joining node that doesn't drain the queue can't pile up replication threads
+        """
         data = {
             "key": key,
             "value": value
         }
 
-        log_message = f'Replication for key=`{key}` with WR={write_concern}'
+        log_message = f'Replication for log=`{log_name}` key=`{key}` with WR={write_concern}'
 
         if write_concern > 1:
             self.__log(log_message + ' started')
         else:
             self.__log(log_message + ' - sending requests')
 
-        retry_timeout_intervals = (1, 2, 5, 10, 30, 60, 90, 180, 300)
+        members, joining = self.__get_nodes_snapshot()
+        size = len(value.encode())
+
+        for secondary_name, secondary in members.items():
+            if secondary_name not in reserved:
+                # joined after admission
+                secondary.replication_started(size)
 
+        for secondary_name in self.__reserve_joining_capacity(size, joining):
+            self.__abort_join(secondary_name, joining.pop(secondary_name), 'replication queue is full')
+
+        targets = {**members, **joining}
         latch = CountDownLatch(write_concern - 1)
+        # the global in-flight entry is released when all members got the value
+        replicated = CountDownLatch(len(members))
 
-        for secondary_name, secondary in self.__nodes.items():
-            thread = Thread(
-                target=self.__send_data_to_secondary,
-                args=(latch, secondary, data, retry_timeout_intervals, 0, log_message + f' ({secondary_name})')
-            )
-            thread.start()
+        started = 0
 
-        latch.wait()
+        try:
+            for secondary_name, secondary in targets.items():
+                thread = Thread(
+                    target=self.__send_data_to_secondary,
+                    args=(latch if secondary_name in members else None,
+                          replicated if secondary_name in members else None, secondary_name, secondary,
+                          log_name, data, 0, log_message + f' ({secondary_name})', trace, bool(reserved))
+                )
+                thread.start()
+                started += 1
+        except BaseException:
+            # every started thread releases its own reservation, the rest should be released here
+            for secondary_name, secondary in list(targets.items())[started:]:
+                secondary.replication_cancelled(size)
+
+                if secondary_name in members and replicated.count_down() and reserved:
+                    self.__release_inflight_entry()
+
+            raise
+
+        with span(trace, 'replication.latch_wait', acks=write_concern - 1):
+            latch.wait()
 
         if write_concern > 1:
             self.__log(log_message + ' finished')
         else:
             self.__log(log_message + ' - requests are sent')
 
-    def __send_data_to_secondary(self, latch: CountDownLatch, server: Server, data: dict,
-                                 retry_timeout_intervals: tuple[int], max_iterations: int = 0,
-                                 log_message: str = '') -> requests.Response:
-        url = f'{server.get_dsn().rstrip("/")}/message'
+    def __get_retry_backoff(self, previous_backoff: float) -> float:
+        """
+        Decorrelated jitter backoff: every next delay is a random value between the base delay
+        and the tripled previous one, capped with the max delay
+        """
+        return min(self.__retry_backoff_cap, random.uniform(self.__retry_backoff_base, previous_backoff * 3))
 
-        interval_index = 0
-        iteration = 0
+    def __send_request(self, method: str, path: str, server_name: str, server: Server,
+                       **kwargs) -> requests.Response:
+        """
+        Sends request to the provided server applying outbound faults configured for this server
+        Faults are applied in the calling thread, so it should be used only from replication and heartbeat threads
+        """
+        url = f'{server.get_dsn().rstrip("/")}{path}'
+        fault = FaultInjector().pick(FaultRule.DIRECTION_OUTBOUND, f'{method} {path}', server_name)
+
+        if fault is None:
+            return requests.request(method, url, **kwargs)
+
+        timeout = kwargs.get('timeout')
+        timeout = max(timeout) if isinstance(timeout, tuple) else timeout
+
+        if fault.partition:
+            raise requests.ConnectionError(f'{server_name} is partitioned by fault injection')
+
+        if fault.drop or (timeout is not None and fault.delay >= timeout):
+            if timeout is not None:
+                time.sleep(timeout)
+            raise requests.Timeout(f'request to {server_name} is dropped by fault injection')
+
+        time.sleep(fault.delay)
 
-        def _get_timeout(index) -> tuple:
-            interval = retry_timeout_intervals[index]
+        if fault.error_code is not None:
+            response = requests.Response()
+            response.status_code = fault.error_code
+            response.url = url
 
-            if index < len(retry_timeout_intervals) - 1:
-                index += 1
+            return response
 
-            return index, interval
+        return requests.request(method, url, **kwargs)
+
+    def __send_data_to_secondary(self, latch: Optional[CountDownLatch], replicated: Optional[CountDownLatch],
+                                 server_name: str,
+                                 server: Server, log_name: str, data: dict, max_iterations: int = 0,
+                                 log_message: str = '', trace: Optional[Trace] = None,
+                                 is_admitted: bool = True) -> requests.Response:
+        path = self.get_log_path(log_name, '/message')
+        url = f'{server.get_dsn().rstrip("/")}{path}'
+
+        iteration = 0
+        backoff = self.__retry_backoff_base
+        started_replication_at = time.perf_counter()
+        response = None
 
         while True:
             if max_iterations > 0 and iteration >= max_iterations:
                 self.__log(log_message + ': Cancel retry process due to max iteration attempts count reached')
                 break
 
+            if server.is_retired():
+                self.__log(log_message + ': Cancel retry process due to server is removed')
+                break
+
             is_unhealthy = server.is_unhealthy()
 
             if is_unhealthy:
@@ -334,42 +968,114 @@ class DataManager:
 
             server.wait_until_healthy()
 
+            if server.is_retired():
+                continue
+
             if is_unhealthy:
                 self.__log(log_message + f': replication restored due to server is not unhealthy now')
 
             iteration += 1
-            interval_index, timeout = _get_timeout(interval_index)
+            timeout = server.get_request_timeout()
+            started_at = time.monotonic()
 
             try:
-                response = requests.put(url, json=data, timeout=(timeout, timeout))
+                response = self.__send_request('PUT', path, server_name, server, json=data,
+                                               timeout=(timeout, timeout))
+                server.register_rtt(time.monotonic() - started_at)
                 self.__log(log_message + f': got response code =`{response.status_code}` url={url}', 'debug')
 
                 if response.status_code == 204:
                     break
+            except requests.Timeout as err:
+                server.register_request_timeout()
+                self.__log(log_message + f': Exception: ' + type(err).__name__, 'debug')
             except BaseException as err:
                 self.__log(log_message + f': Exception: ' + type(err).__name__, 'debug')
 
-            self.__log(log_message + f': set timeout =`{timeout}')
+            backoff = self.__get_retry_backoff(backoff)
+            self.__log(log_message + f': retry in `{backoff:.3f}` seconds, timeout was `{timeout:.3f}`')
+            time.sleep(backoff)
 
-        latch.count_down()
+        if server.is_retired():
+            server.replication_cancelled(len(data['value'].encode()))
+        else:
+            server.replication_finished(len(data['value'].encode()))
+
+        if trace is not None:
+            trace.add_span(f'replication.{server_name}', started_replication_at,
+                           time.perf_counter() - started_replication_at, {'attempts': iteration})
+
+        if replicated is not None and replicated.count_down() and is_admitted:
+            self.__release_inflight_entry()
+
+        if latch is not None:
+            latch.count_down()
 
         return response
 
+    def __send_snapshot(self, server_name: str, server: Server, log_name: str,
+                        log_storage: storage.DataStorageInterface, snapshot_index: int, deadline: float) -> bool:
+        """
+        Streams log values up to snapshot_index in compressed chunks
+        Not committed values are included as well: they were stored before the secondary started joining,
+        so the live replication doesn't send them to it
+        Returns False if the server was removed or the snapshot was not sent before the deadline
+        """
+        path = self.get_log_path(log_name, '/snapshot')
+        last_sent_index = 0
+
+        while True:
+            items = log_storage.get_items(last_sent_index, snapshot_index, self.__snapshot_chunk_size)
+
+            if not items:
+                break
+
+            payload = zlib.compress(json.dumps(items).encode())
+            backoff = self.__retry_backoff_base
+
+            while True:
+                if server.is_retired() or time.monotonic() >= deadline:
+                    return False
+
+                if not server.wait_until_healthy(self.__heartbeat_interval):
+                    continue
+
+                try:
+                    response = self.__send_request('PUT', path, server_name, server, data=payload,
+                                                   headers={'Content-Type': 'application/octet-stream'},
+                                                   timeout=self.__snapshot_request_timeout)
+
+                    if response.status_code == 204:
+                        break
+                except BaseException as err:
+                    self.__log(f'Snapshot {server_name}: Exception: ' + type(err).__name__, 'debug')
+
+                backoff = self.__get_retry_backoff(backoff)
+                time.sleep(backoff)
+
+            last_sent_index = items[-1][0]
+            self.__log(f'Snapshot {server_name}: log `{log_name}` is sent up to key {last_sent_index}', 'debug')
+
+        return True
+
     def __start_heartbeat(self) -> None:
         if self.is_secondary():
             return
 
         self.__log(f'Start heartbeats with interval {self.__heartbeat_interval}')
 
-        for secondary_name, secondary in self.__nodes.items():
-            thread = RepeatTimer(
-                interval=self.__heartbeat_interval,
-                function=self.__heartbeat_handler,
-                args=(secondary_name, secondary, self.__heartbeat_interval)
-            )
-            thread.start()
+        for secondary_name, secondary in self.__get_nodes_snapshot()[0].items():
+            self.__start_node_heartbeat(secondary_name, secondary)
+
+    def __start_node_heartbeat(self, server_name: str, server: Server) -> None:
+        thread = RepeatTimer(
+            interval=self.__heartbeat_interval,
+            function=self.__heartbeat_handler,
+            args=(server_name, server, self.__heartbeat_interval)
+        )
+        thread.start()
 
-            self.__heartbeat_threads.append(thread)
+        self.__heartbeat_threads[server_name] = thread
 
     def __stop_heartbeat(self):
         if self.is_secondary():
@@ -377,7 +1083,7 @@ class DataManager:
 
         self.__log(f'Stop heartbeats')
 
-        for thread in self.__heartbeat_threads:
+        for thread in list(self.__heartbeat_threads.values()):
             thread.cancel()
 
     def __heartbeat_handler(self, server_name: str, server: Server, timeout: int) -> None:
@@ -386,10 +1092,14 @@ class DataManager:
         is_node_status_changed = False
 
         try:
-            response = requests.get(url, timeout=(timeout / 2, timeout / 2))
+            started_at = time.monotonic()
+            response = self.__send_request('GET', '/heartbeat', server_name, server,
+                                           timeout=(timeout / 2, timeout / 2))
+            server.register_rtt(time.monotonic() - started_at)
             self.__log(f'Heartbeat {server_name}: got response code =`{response.status_code}` url={url}', 'debug')
 
             if response.status_code == 200:
+                server.register_applied_indexes(response.json().get('logs', {}))
                 is_node_status_changed = not server.is_healthy()
                 server.mark_as_healthy()
         except BaseException as err:
@@ -413,9 +1123,8 @@ def get_data_manager_instance() -> DataManager:
         except yaml.YAMLError as exc:
             print(exc)
 
-    storage_object = storage.MemoryStorage()
-    manager = DataManager(mode, storage_object, app_name, config)
+    manager = DataManager(mode, storage.MemoryStorage, app_name, config)
 
-    logger.debug(f'! get data manager instance {app_name}: {str(id(manager))} ({str(id(storage_object))})')
+    logger.debug(f'! get data manager instance {app_name}: {str(id(manager))}')
 
     return manager
@@ -0,0 +1,237 @@
+import multiprocessing
+import random
+from fnmatch import fnmatchcase
+from typing import Optional
+
+
+class FaultRule:
+    """
+    The service class for FaultInjector represents a single fault definition:
+     - endpoint and peer filters, empty filter matches everything
+     - direction: inbound rules are applied to incoming requests, outbound rules - to requests sent by the node
+     - latency sampled from the provided distribution
+     - drop rate, error rate with error code and network partition
+     - optional number of applications, the rule is removed when it's exhausted
+    """
+    DIRECTION_INBOUND = 'inbound'
+    DIRECTION_OUTBOUND = 'outbound'
+
+    LATENCY_FIXED = 'fixed'
+    LATENCY_UNIFORM = 'uniform'
+    LATENCY_NORMAL = 'normal'
+    LATENCY_EXPONENTIAL = 'exponential'
+
+    __id: int
+    __endpoint: Optional[str]
+    __peer: Optional[str]
+    __direction: str
+    __latency_distribution: str
+    __latency_ms: float
+    __latency_max_ms: float
+    __latency_stddev_ms: float
+    __drop_rate: float
+    __error_rate: float
+    __error_code: int
+    __partition: bool
+    __count: Optional[int]
+
+    def __init__(self, endpoint: Optional[str] = None, peer: Optional[str] = None,
+                 direction: str = DIRECTION_INBOUND, latency_distribution: str = LATENCY_FIXED,
+                 latency_ms: float = 0, latency_max_ms: float = 0, latency_stddev_ms: float = 0,
+                 drop_rate: float = 0, error_rate: float = 0, error_code: int = 500, partition: bool = False,
+                 count: Optional[int] = None):
+        """
+        :param endpoint: `METHOD /path` or `/path` to match requests of any method, shell-style wildcards are
+                         supported, e.g. `PUT */message` matches replication requests of all logs
+        :param peer: secondary name from config for outbound rules, client host for inbound rules
+        :param error_code: HTTP status of injected errors, only 4xx and 5xx codes are allowed
+        :param latency_ms: fixed latency or mean value for normal and exponential distributions,
+                           min value for uniform distribution
+        :param latency_max_ms: max value for uniform distribution
+        :param latency_stddev_ms: standard deviation for normal distribution
+        :param count: how many times the rule is applied, unlimited by default
+        """
+        if direction not in [self.DIRECTION_INBOUND, self.DIRECTION_OUTBOUND]:
+            raise Exception("Unsupported direction " + direction)
+
+        if latency_distribution not in [self.LATENCY_FIXED, self.LATENCY_UNIFORM, self.LATENCY_NORMAL,
+                                        self.LATENCY_EXPONENTIAL]:
+            raise Exception("Unsupported latency distribution " + latency_distribution)
+
+        if not 0 <= drop_rate <= 1 or not 0 <= error_rate <= 1:
+            raise Exception("Drop rate and error rate should be in range [0, 1]")
+
+        if count is not None and count < 1:
+            raise Exception("Count should be a positive number")
+
+        if not 400 <= error_code <= 599:
+            raise Exception("Error code should be 4xx or 5xx HTTP status")
+
+        self.__id = 0
+        self.__endpoint = endpoint
+        self.__peer = peer
+        self.__direction = direction
+        self.__latency_distribution = latency_distribution
+        self.__latency_ms = latency_ms
+        self.__latency_max_ms = latency_max_ms
+        self.__latency_stddev_ms = latency_stddev_ms
+        self.__drop_rate = drop_rate
+        self.__error_rate = error_rate
+        self.__error_code = error_code
+        self.__partition = partition
+        self.__count = count
+
+    def get_id(self) -> int:
+        return self.__id
+
+    def set_id(self, rule_id: int) -> None:
+        self.__id = rule_id
+
+    def matches(self, direction: str, endpoint: str, peer: Optional[str]) -> bool:
+        if self.__direction != direction:
+            return False
+
+        if self.__endpoint is not None:
+            # `/path` filter matches the path regardless of the request method
+            expected = endpoint if ' ' in self.__endpoint else endpoint.split(' ', 1)[-1]
+
+            if not fnmatchcase(expected, self.__endpoint):
+                return False
+
+        return self.__peer is None or self.__peer == peer
+
+    def apply(self, fault: 'Fault') -> bool:
+        """
+        Adds the rule effects into the provided fault
+        Returns False when the rule is exhausted and should be removed
+        """
+        fault.delay += self.__sample_latency()
+        fault.partition = fault.partition or self.__partition
+        fault.drop = fault.drop or random.random() < self.__drop_rate
+
+        if fault.error_code is None and random.random() < self.__error_rate:
+            fault.error_code = self.__error_code
+
+        if self.__count is not None:
+            self.__count -= 1
+
+            return self.__count > 0
+
+        return True
+
+    def get_latency_ms(self) -> float:
+        return self.__latency_ms
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.__id,
+            'endpoint': self.__endpoint,
+            'peer': self.__peer,
+            'direction': self.__direction,
+            'latency_distribution': self.__latency_distribution,
+            'latency_ms': self.__latency_ms,
+            'latency_max_ms': self.__latency_max_ms,
+            'latency_stddev_ms': self.__latency_stddev_ms,
+            'drop_rate': self.__drop_rate,
+            'error_rate': self.__error_rate,
+            'error_code': self.__error_code,
+            'partition': self.__partition,
+            'count': self.__count,
+        }
+
+    def __sample_latency(self) -> float:
+        """Returns latency in seconds"""
+        if self.__latency_distribution == self.LATENCY_UNIFORM:
+            latency = random.uniform(self.__latency_ms, self.__latency_max_ms)
+        elif self.__latency_distribution == self.LATENCY_NORMAL:
+            latency = random.gauss(self.__latency_ms, self.__latency_stddev_ms)
+        elif self.__latency_distribution == self.LATENCY_EXPONENTIAL:
+            latency = random.expovariate(1 / self.__latency_ms) if self.__latency_ms > 0 else 0
+        else:
+            latency = self.__latency_ms
+
+        return max(0, latency) / 1000
+
+
+class Fault:
+    """
+    The service class for FaultInjector represents the combined effect of all rules matched by a request
+    """
+
+    def __init__(self):
+        self.delay = 0
+        self.drop = False
+        self.partition = False
+        self.error_code = None
+
+
+class FaultInjector:
+    """
+    Registry of fault rules, represents a thread-safe singleton
+    The injector only decides which faults to apply, the caller is responsible for applying them
+    without blocking shared workers
+    """
+    __instance = None
+    __lock = multiprocessing.Lock()
+    __rules: dict[int, FaultRule] = {}
+    __last_id = 0
+    __drop_hold_seconds = 60
+
+    def __new__(cls):
+        if not cls.__instance:
+            with cls.__lock:
+                if not cls.__instance:
+                    cls.__instance = super(FaultInjector, cls).__new__(cls)
+        return cls.__instance
+
+    def add_rule(self, rule: FaultRule) -> int:
+        with self.__lock:
+            FaultInjector.__last_id += 1
+            rule.set_id(self.__last_id)
+            self.__rules[rule.get_id()] = rule
+
+        return rule.get_id()
+
+    def get_rule(self, rule_id: int) -> Optional[FaultRule]:
+        return self.__rules.get(rule_id)
+
+    def remove_rule(self, rule_id: int) -> bool:
+        with self.__lock:
+            return self.__rules.pop(rule_id, None) is not None
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__rules.clear()
+
+    def get_rules(self) -> list[dict]:
+        with self.__lock:
+            return [rule.to_dict() for rule in self.__rules.values()]
+
+    def get_drop_hold_seconds(self) -> float:
+        """Returns for how long a dropped inbound request holds the connection without a response"""
+        return self.__drop_hold_seconds
+
+    def set_drop_hold_seconds(self, seconds: float) -> None:
+        FaultInjector.__drop_hold_seconds = seconds
+
+    def pick(self, direction: str, endpoint: str, peer: Optional[str] = None) -> Optional[Fault]:
+        """
+        Returns combined fault of all rules matched by the request or None if there are no such rules
+        :param endpoint: `METHOD /path`
+        """
+        if not self.__rules:
+            return None
+
+        fault = None
+
+        with self.__lock:
+            for rule_id, rule in list(self.__rules.items()):
+                if not rule.matches(direction, endpoint, peer):
+                    continue
+
+                fault = fault if fault is not None else Fault()
+
+                if not rule.apply(fault):
+                    del self.__rules[rule_id]
+
+        return fault
@@ -1,5 +1,59 @@
 import multiprocessing
+import time
+from collections import deque
 from threading import Event
+from typing import Optional
+
+
+class RttEstimator:
+    """
+    Round-trip time estimator that derives request timeout in the same way as TCP does (RFC 6298):
+     - SRTT and RTTVAR are smoothed with alpha = 1/8 and beta = 1/4
+     - timeout = SRTT + 4 * RTTVAR, bounded with min and max values
+     - timeout is doubled after each expired request until the next successful measurement
+    """
+    __ALPHA = 1 / 8
+    __BETA = 1 / 4
+    __K = 4
+
+    __srtt: float = None
+    __rttvar: float = None
+    __timeout: float
+    __min_timeout: float
+    __max_timeout: float
+
+    def __init__(self, initial_timeout: float = 1, min_timeout: float = 0.1, max_timeout: float = 5):
+        self.__min_timeout = min_timeout
+        self.__max_timeout = max_timeout
+        self.__timeout = self.__bound(initial_timeout)
+        self.__lock = multiprocessing.Lock()
+
+    def register_sample(self, rtt: float) -> None:
+        with self.__lock:
+            if self.__srtt is None:
+                self.__srtt = rtt
+                self.__rttvar = rtt / 2
+            else:
+                self.__rttvar = (1 - self.__BETA) * self.__rttvar + self.__BETA * abs(self.__srtt - rtt)
+                self.__srtt = (1 - self.__ALPHA) * self.__srtt + self.__ALPHA * rtt
+
+            self.__timeout = self.__bound(self.__srtt + self.__K * self.__rttvar)
+
+    def register_timeout(self) -> None:
+        with self.__lock:
+            self.__timeout = self.__bound(self.__timeout * 2)
+
+    def get_timeout(self) -> float:
+        return self.__timeout
+
+    def get_srtt(self) -> float:
+        return self.__srtt
+
+    def get_rttvar(self) -> float:
+        return self.__rttvar
+
+    def __bound(self, timeout: float) -> float:
+        return max(self.__min_timeout, min(self.__max_timeout, timeout))
 
 
 class Server:
@@ -21,13 +75,25 @@ class Server:
     __heartbeat_alive_limit = 5
     __heartbeat_suspected_limit = 2
     __heartbeat_failed_requests = 0
+    __retired = False
+    __inflight_entries: int
+    __inflight_bytes: int
+    __drained: deque
+    __drain_rate_window = 10
+    __rtt: RttEstimator
+    __applied_index: Optional[dict[str, int]] = None
 
-    def __init__(self, dsn: str, mode: str, alive_limit: int = 5, suspected_rate: int = 2):
+    def __init__(self, dsn: str, mode: str, alive_limit: int = 5, suspected_rate: int = 2,
+                 rtt_estimator: RttEstimator = None):
         self.__dsn = dsn
         self.__mode = mode
         self.__heartbeat_alive_limit = alive_limit
         self.__heartbeat_suspected_limit = suspected_rate
         self.__connectionState = Event()
+        self.__inflight_entries = 0
+        self.__inflight_bytes = 0
+        self.__drained = deque()
+        self.__rtt = rtt_estimator if rtt_estimator is not None else RttEstimator()
 
         self.mark_as_healthy()
 
@@ -47,7 +113,20 @@ class Server:
     def mark_as_unhealthy(self) -> None:
         with self.__lock:
             self.__status = self.__STATUS_UNHEALTHY
-            self.__connectionState.clear()  # mark as closed to sending requests
+
+            if not self.__retired:
+                self.__connectionState.clear()  # mark as closed to sending requests
+
+    def retire(self) -> None:
+        """
+        Marks the server as removed from the cluster, wakes up all threads waiting until it's healthy
+        """
+        with self.__lock:
+            self.__retired = True
+            self.__connectionState.set()
+
+    def is_retired(self) -> bool:
+        return self.__retired
 
     def is_healthy(self) -> bool:
         return self.__STATUS_HEALTHY == self.__status
@@ -72,8 +151,8 @@ class Server:
     def is_secondary(self) -> bool:
         return self.MODE_SECONDARY == self.__mode
 
-    def wait_until_healthy(self):
-        self.__connectionState.wait()
+    def wait_until_healthy(self, timeout: float = None) -> bool:
+        return self.__connectionState.wait(timeout)
 
     def heartbeat_failed(self):
         is_status_changed = False
@@ -91,3 +170,90 @@ class Server:
                     self.mark_as_suspected()
 
         return is_status_changed
+
+    def register_rtt(self, rtt: float) -> None:
+        self.__rtt.register_sample(rtt)
+
+    def register_request_timeout(self) -> None:
+        self.__rtt.register_timeout()
+
+    def get_request_timeout(self) -> float:
+        return self.__rtt.get_timeout()
+
+    def get_srtt(self) -> float:
+        return self.__rtt.get_srtt()
+
+    def get_rttvar(self) -> float:
+        return self.__rtt.get_rttvar()
+
+    def register_applied_indexes(self, indexes: dict[str, int]) -> None:
+        """
+        Registers consistent index of every log reported by the server itself
+        The reported values replace the previous ones, so a restarted server with lost data shows its real lag
+        """
+        self.__applied_index = dict(indexes)
+
+    def has_reported_applied_index(self) -> bool:
+        return self.__applied_index is not None
+
+    def get_applied_index(self, log_name: str) -> Optional[int]:
+        """
+        Returns None if the server has not reported its indexes yet
+        """
+        if self.__applied_index is None:
+            return None
+
+        return self.__applied_index.get(log_name, 0)
+
+    def get_inflight_entries(self) -> int:
+        return self.__inflight_entries
+
+    def get_inflight_bytes(self) -> int:
+        return self.__inflight_bytes
+
+    def can_accept(self, size: int, max_entries: int = None, max_bytes: int = None) -> bool:
+        """
+        Checks whether one more unreplicated entry of the given size fits into the provided limits
+        """
+        if max_entries is not None and self.__inflight_entries + 1 > max_entries:
+            return False
+
+        if max_bytes is not None and self.__inflight_bytes + size > max_bytes:
+            return False
+
+        return True
+
+    def replication_started(self, size: int) -> None:
+        with self.__lock:
+            self.__inflight_entries += 1
+            self.__inflight_bytes += size
+
+    def replication_finished(self, size: int) -> None:
+        with self.__lock:
+            self.__inflight_entries -= 1
+            self.__inflight_bytes -= size
+            self.__drained.append(time.monotonic())
+            self.__trim_drained()
+
+    def replication_cancelled(self, size: int) -> None:
+        """
+        Releases in-flight entry that was not sent, doesn't affect the drain rate
+        """
+        with self.__lock:
+            self.__inflight_entries -= 1
+            self.__inflight_bytes -= size
+
+    def get_drain_rate(self) -> float:
+        """
+        Returns the number of entries replicated to the server per second during the last drain rate window
+        """
+        with self.__lock:
+            self.__trim_drained()
+
+            return len(self.__drained) / self.__drain_rate_window
+
+    def __trim_drained(self) -> None:
+        threshold = time.monotonic() - self.__drain_rate_window
+
+        while self.__drained and self.__drained[0] < threshold:
+            self.__drained.popleft()
@@ -0,0 +1,75 @@
+import multiprocessing
+import os
+import sys
+import threading
+from collections import Counter
+from threading import Event
+from threading import Thread
+
+
+class SamplingProfilerBusyException(Exception):
+    pass
+
+
+class SamplingProfiler:
+    """
+    Simple sampling profiler for all threads of the process:
+     - periodically takes stacks of all threads with sys._current_frames() from a background thread
+     - aggregates samples into collapsed stacks (`thread;outer;...;inner count`) ready for flamegraph tools
+     - only one profiling session can be run at the same time, there is no overhead when it's not running
+    """
+    __running_lock = multiprocessing.Lock()
+
+    __interval: float
+    __samples: Counter
+    __stopped: Event
+    __thread: Thread = None
+
+    def __init__(self, interval: float = 0.005):
+        """
+        :param interval: sampling interval in seconds
+        """
+        self.__interval = interval
+        self.__samples = Counter()
+        self.__stopped = Event()
+
+    def start(self) -> None:
+        if not self.__running_lock.acquire(block=False):
+            raise SamplingProfilerBusyException('Profiler is already running')
+
+        self.__thread = Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def stop(self) -> None:
+        if self.__thread is None:
+            return
+
+        self.__stopped.set()
+        self.__thread.join()
+        self.__thread = None
+        self.__running_lock.release()
+
+    def get_collapsed_stacks(self) -> str:
+        lines = [f'{stack} {count}' for stack, count in self.__samples.most_common()]
+
+        return '\n'.join(lines) + '\n' if lines else ''
+
+    def __run(self) -> None:
+        own_ident = threading.get_ident()
+
+        while not self.__stopped.wait(self.__interval):
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+
+                stack = []
+
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                    frame = frame.f_back
+
+                stack.append(thread_names.get(ident, str(ident)))
+                self.__samples[';'.join(reversed(stack))] += 1
@@ -1,5 +1,7 @@
 import multiprocessing
+import time
 from sortedcontainers import SortedSet
+from distributed_log.tracing import get_active_span_attributes
 
 
 class DataStorageInterface:
@@ -36,10 +38,25 @@ class DataStorageInterface:
         """Returns list of stored values"""
         pass
 
+    def get_items(self, min_index: int, max_index: int, limit: int = None) -> list[tuple[int, str]]:
+        """
+        Returns (key, value) pairs of not rolled back values with keys in range (min_index, max_index] ordered by key
+        """
+        pass
+
+    def get_last_index(self) -> int:
+        """Returns the highest index stored"""
+        pass
+
+    def get_consistent_index(self) -> int:
+        """Returns the highest index of the consistent prefix - values without gaps and not committed values"""
+        pass
+
 
 class MemoryStorage(DataStorageInterface):
     """
-    Simple memory storage that represents a thread-safe singleton and supports next features:
+    Simple thread-safe memory storage, every instance keeps its own data, lock and index sequence,
+    supports next features:
      - thread-safe indexing of data in storage to avoid overriding data in case of multiple connections
      - a simple mechanism to commit and rollback changes
      - several modes to get the list of stored values
@@ -49,19 +66,19 @@ class MemoryStorage(DataStorageInterface):
     LIST_MODE_ALL_COMMITTED = 'LIST_COMMITTED'
     LIST_MODE_CONSISTENT_ORDER = 'LIST_CONSISTENT_ORDER'
 
-    __instance = None
-    __lock = multiprocessing.Lock()
-    __data = {}
-    __index = 0
-    __index_pool = SortedSet()
+    __lock: multiprocessing.Lock
+    __data: dict
+    __index: int
+    __index_pool: SortedSet
+    __consistent_index: int
     __mode = LIST_MODE_CONSISTENT_ORDER
 
-    def __new__(cls):
-        if not cls.__instance:
-            with cls.__lock:
-                if not cls.__instance:
-                    cls.__instance = super(MemoryStorage, cls).__new__(cls)
-        return cls.__instance
+    def __init__(self):
+        self.__lock = multiprocessing.Lock()
+        self.__data = {}
+        self.__index = 0
+        self.__index_pool = SortedSet()
+        self.__consistent_index = 0
 
     def add_value(self, value: str, commit=False) -> int:
         item = self.__DataItem(value)
@@ -69,11 +86,12 @@ class MemoryStorage(DataStorageInterface):
         if commit:
             item.commit()
 
-        with self.__lock:
+        with self.__locked():
             index = self.__index + 1
             self.__data[index] = item
             self.__index_pool.add(index)
             self.__index = index
+            self.__advance_consistent_index()
 
         return index
 
@@ -92,10 +110,11 @@ class MemoryStorage(DataStorageInterface):
         if commit:
             item.commit()
 
-        with self.__lock:
+        with self.__locked():
             self.__data[key] = item
             self.__index_pool.add(key)
             self.__index = max(self.__index, key)
+            self.__advance_consistent_index()
 
         return True
 
@@ -107,8 +126,9 @@ class MemoryStorage(DataStorageInterface):
         if key not in self.__data:
             return False
 
-        with self.__lock:
+        with self.__locked():
             self.__data[key].commit()
+            self.__advance_consistent_index()
 
     def rollback_value(self, key: int) -> bool:
         """
@@ -118,8 +138,9 @@ class MemoryStorage(DataStorageInterface):
         if key not in self.__data:
             return False
 
-        with self.__lock:
+        with self.__locked():
             self.__data[key].rollback()
+            self.__advance_consistent_index()
 
     def get_list(self) -> list[str]:
         """
@@ -130,7 +151,7 @@ class MemoryStorage(DataStorageInterface):
         """
         values = []
 
-        with self.__lock:
+        with self.__locked():
             previous_index = None
 
             for index in self.__index_pool:
@@ -151,6 +172,48 @@ class MemoryStorage(DataStorageInterface):
     def get_value(self, key: int) -> str:
         return self.__data[key].get_value() if key in self.__data else None
 
+    def get_items(self, min_index: int, max_index: int, limit: int = None) -> list[tuple[int, str]]:
+        """
+        Returns (key, value) pairs of not rolled back values with keys in range (min_index, max_index] ordered by key
+        Values that are not committed yet are included too
+        """
+        items = []
+
+        with self.__locked():
+            for index in self.__index_pool.irange(min_index, max_index, inclusive=(False, True)):
+                if limit is not None and len(items) >= limit:
+                    break
+
+                item = self.__data[index]
+
+                if not item.is_rolled_back():
+                    items.append((index, item.get_value()))
+
+        return items
+
+    def get_last_index(self) -> int:
+        return self.__index
+
+    def get_consistent_index(self) -> int:
+        return self.__consistent_index
+
+    def __locked(self):
+        """
+        Returns the storage lock, the lock wait time is added to the active trace span if there is one
+        """
+        attributes = get_active_span_attributes()
+
+        return self.__lock if attributes is None else self.__TimedLock(self.__lock, attributes)
+
+    def __advance_consistent_index(self) -> None:
+        """Should be called under the storage lock"""
+        index = self.__consistent_index
+
+        while index + 1 in self.__data and not self.__data[index + 1].is_added():
+            index += 1
+
+        self.__consistent_index = index
+
     def set_getting_list_mode(self, mode: str) -> None:
         if mode not in [self.LIST_MODE_ALL_COMMITTED, self.LIST_MODE_CONSISTENT_ORDER]:
             raise Exception("Unsupported mode " + mode)
@@ -160,6 +223,24 @@ class MemoryStorage(DataStorageInterface):
     def get_count(self) -> int:
         return len(self.__index_pool)
 
+    class __TimedLock:
+        """
+        The service class for MemoryStorage acquires the lock and stores the waiting time in span attributes
+        """
+
+        def __init__(self, lock, attributes: dict):
+            self.__lock = lock
+            self.__attributes = attributes
+
+        def __enter__(self):
+            started_at = time.perf_counter()
+            self.__lock.acquire()
+            lock_wait = self.__attributes.get('lock_wait_ms', 0) + (time.perf_counter() - started_at) * 1000
+            self.__attributes['lock_wait_ms'] = round(lock_wait, 3)
+
+        def __exit__(self, exc_type, exc_value, traceback):
+            self.__lock.release()
+
     class __DataItem:
         """
         The service class for MemoryStorage represents a simple data object with value and status
@@ -0,0 +1,138 @@
+import multiprocessing
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextlib import nullcontext
+from typing import Optional
+
+_active_span = threading.local()
+
+
+def get_active_span_attributes() -> Optional[dict]:
+    """
+    Returns attributes of the span currently open in this thread or None if there is no such span
+    Allows lower layers (e.g. storage) to add measurements to the span without knowing about the trace
+    """
+    return getattr(_active_span, 'attributes', None)
+
+
+class Trace:
+    """
+    Represents a single traced request: a list of spans with offsets and durations in milliseconds
+    Spans can be added from several threads, including after the request itself is finished
+    """
+    __name: str
+    __attributes: dict
+    __started_at: float
+    __duration: Optional[float] = None
+    __spans: list[dict]
+
+    def __init__(self, name: str, attributes: dict):
+        self.__name = name
+        self.__attributes = attributes
+        self.__started_at = time.perf_counter()
+        self.__spans = []
+        self.__lock = multiprocessing.Lock()
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """
+        Measures the wrapped block, attributes can be updated inside the block via the yielded dict
+        """
+        started_at = time.perf_counter()
+        parent_attributes = getattr(_active_span, 'attributes', None)
+        _active_span.attributes = attributes
+
+        try:
+            yield attributes
+        finally:
+            _active_span.attributes = parent_attributes
+            self.add_span(name, started_at, time.perf_counter() - started_at, attributes)
+
+    def add_span(self, name: str, started_at: float, duration: float, attributes: dict = None) -> None:
+        span = {
+            'name': name,
+            'offset_ms': round((started_at - self.__started_at) * 1000, 3),
+            'duration_ms': round(duration * 1000, 3),
+        }
+
+        if attributes:
+            span['attributes'] = attributes
+
+        with self.__lock:
+            self.__spans.append(span)
+
+    def finish(self) -> None:
+        self.__duration = time.perf_counter() - self.__started_at
+
+    def to_dict(self) -> dict:
+        with self.__lock:
+            spans = list(self.__spans)
+
+        return {
+            'name': self.__name,
+            'attributes': self.__attributes,
+            'duration_ms': round(self.__duration * 1000, 3) if self.__duration is not None else None,
+            'spans': spans,
+        }
+
+
+class Tracer:
+    """
+    Keeps the latest finished traces in a ring buffer, represents a thread-safe singleton
+    When tracing is disabled no Trace objects are created and spans are replaced with a no-op context
+    """
+    __instance = None
+    __lock = multiprocessing.Lock()
+    __enabled = False
+    __traces = deque(maxlen=100)
+
+    def __new__(cls):
+        if not cls.__instance:
+            with cls.__lock:
+                if not cls.__instance:
+                    cls.__instance = super(Tracer, cls).__new__(cls)
+        return cls.__instance
+
+    def is_enabled(self) -> bool:
+        return self.__enabled
+
+    def set_enabled(self, enabled: bool) -> None:
+        Tracer.__enabled = enabled
+
+    def set_buffer_size(self, size: int) -> None:
+        with self.__lock:
+            Tracer.__traces = deque(self.__traces, maxlen=size)
+
+    def start_trace(self, name: str, **attributes) -> Optional[Trace]:
+        if not self.__enabled:
+            return None
+
+        return Trace(name, attributes)
+
+    def finish_trace(self, trace: Optional[Trace]) -> None:
+        if trace is None:
+            return
+
+        trace.finish()
+
+        with self.__lock:
+            self.__traces.append(trace)
+
+    def get_traces(self, limit: int = None) -> list[dict]:
+        with self.__lock:
+            traces = list(self.__traces)
+
+        if limit is not None:
+            traces = traces[-limit:] if limit > 0 else []
+
+        return [trace.to_dict() for trace in traces]
+
+
+def span(trace: Optional[Trace], name: str, **attributes):
+    """Returns trace span or no-op context if the request is not traced"""
+    if trace is None:
+        return nullcontext(attributes)
+
+    return trace.span(name, **attributes)
@@ -1,11 +1,25 @@
 import uvicorn
-from fastapi import FastAPI, Response
+from fastapi import FastAPI, Request, Response
 from typing import Union
 from pydantic import BaseModel
 from starlette.responses import JSONResponse
+from starlette.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
 from distributed_log.data_manager import get_data_manager_instance
+from distributed_log.data_manager import DataManager
+from distributed_log.data_manager import DataManagerInvalidLogNameException
+from distributed_log.data_manager import DataManagerReadTimeoutException
+from distributed_log.data_manager import DataManagerSecondaryExistsException
+from distributed_log.data_manager import DataManagerSecondaryNotFoundException
 from distributed_log.data_manager import DataManagerReadonlyModeException
-import time
+from distributed_log.data_manager import DataManagerBackpressureException
+from distributed_log.data_manager import DataManagerValueTooLargeException
+from distributed_log.fault_injection import FaultInjector
+from distributed_log.fault_injection import FaultRule
+from distributed_log.profiler import SamplingProfiler
+from distributed_log.profiler import SamplingProfilerBusyException
+from distributed_log.tracing import Tracer
+import asyncio
 
 
 class DelayValue(BaseModel):
@@ -22,8 +36,61 @@ class SyncValue(BaseModel):
     value: str
 
 
+class FaultRuleValue(BaseModel):
+    endpoint: Union[str, None] = None
+    peer: Union[str, None] = None
+    direction: str = FaultRule.DIRECTION_INBOUND
+    latency_distribution: str = FaultRule.LATENCY_FIXED
+    latency_ms: float = 0
+    latency_max_ms: float = 0
+    latency_stddev_ms: float = 0
+    drop_rate: float = 0
+    error_rate: float = 0
+    error_code: int = 500
+    partition: bool = False
+    count: Union[int, None] = None
+
+
+class TracingValue(BaseModel):
+    enabled: bool
+
+
+class SecondaryValue(BaseModel):
+    name: str
+    address: str
+
+
 app = FastAPI()
-app.delay = 0  # for imitating delay during the testing
+app.delay_rule_id = None  # fault rule created by the `/delay` endpoint
+
+
+@app.middleware("http")
+async def inject_faults(request: Request, call_next):
+    """
+    Applies inbound faults before the request reaches the endpoint
+    Delays are awaited on the event loop, so worker threads are not blocked
+    """
+    if request.url.path.startswith('/admin'):
+        return await call_next(request)
+
+    peer = request.client.host if request.client else None
+    fault = FaultInjector().pick(FaultRule.DIRECTION_INBOUND, f'{request.method} {request.url.path}', peer)
+
+    if fault is None:
+        return await call_next(request)
+
+    if fault.partition or fault.drop:
+        # hold the connection without response to make the client hit its timeout
+        await asyncio.sleep(FaultInjector().get_drop_hold_seconds())
+        return Response(status_code=503)
+
+    if fault.delay > 0:
+        await asyncio.sleep(fault.delay)
+
+    if fault.error_code is not None:
+        return JSONResponse('Error injected by fault injection', status_code=fault.error_code)
+
+    return await call_next(request)
 
 
 @app.on_event("startup")
@@ -38,35 +105,99 @@ def shutdown_event():
 
 @app.post("/message", status_code=201)
 def add_value(inpt: NewValue, response: Response):
+    return add_log_value(DataManager.DEFAULT_LOG, inpt, response)
+
+
+@app.post("/logs/{name}/message", status_code=201)
+def add_log_value(name: str, inpt: NewValue, response: Response):
     try:
-        get_data_manager_instance().add_value(inpt.value, inpt.write_concern)
+        key = get_data_manager_instance().add_value(inpt.value, inpt.write_concern, name)
+    except DataManagerInvalidLogNameException as err:
+        return JSONResponse(str(err), status_code=400)
     except DataManagerReadonlyModeException as err:
         return JSONResponse(str(err), status_code=503)
+    except DataManagerBackpressureException as err:
+        return JSONResponse(str(err), status_code=429, headers={'Retry-After': str(err.retry_after)})
+    except DataManagerValueTooLargeException as err:
+        return JSONResponse(str(err), status_code=413)
     except BaseException as err:
         return JSONResponse(str(err), status_code=405)
 
+    response.headers['X-Log-Index'] = str(key)
+
     return True
 
 
 @app.put("/message", status_code=204)
 def set_value(inpt: SyncValue, response: Response):
-    # sleep for `delay` seconds and reset delay
-    if app.delay > 0:
-        delay = app.delay
-        app.delay = 0
-        time.sleep(delay)
+    return set_log_value(DataManager.DEFAULT_LOG, inpt, response)
+
 
+@app.put("/logs/{name}/message", status_code=204)
+def set_log_value(name: str, inpt: SyncValue, response: Response):
     try:
-        get_data_manager_instance().set_value(inpt.key, inpt.value)
+        get_data_manager_instance().set_value(inpt.key, inpt.value, name)
     except BaseException as err:
-        return JSONResponse(err, status_code=405)
+        return JSONResponse(str(err), status_code=405)
 
     return None
 
 
 @app.get("/messages", status_code=200)
-def get_data(response: Response):
-    return get_data_manager_instance().get_values()
+async def get_data(response: Response, min_index: Union[int, None] = None, timeout: Union[float, None] = None):
+    return await get_log_data(DataManager.DEFAULT_LOG, response, min_index, timeout)
+
+
+@app.get("/logs/{name}/messages", status_code=200)
+async def get_log_data(name: str, response: Response, min_index: Union[int, None] = None,
+                       timeout: Union[float, None] = None):
+    """
+    Waiting for min_index is done on the event loop, only reading the values uses a worker thread
+    :param min_index: wait until all values up to this index are available, e.g. for read-your-writes after WC=1
+    :param timeout: max waiting time in seconds
+    """
+    manager = await run_in_threadpool(get_data_manager_instance)
+
+    if min_index is not None:
+        try:
+            await manager.wait_for_index(name, min_index, timeout)
+        except DataManagerInvalidLogNameException as err:
+            return JSONResponse(str(err), status_code=400)
+        except DataManagerReadTimeoutException as err:
+            headers = {'X-Log-Index': str(manager.get_consistent_index(name))}
+            return JSONResponse(str(err), status_code=504, headers=headers)
+
+    # the index is taken before the values, so returned values contain at least all values up to it
+    index = manager.get_consistent_index(name)
+    items = await run_in_threadpool(manager.get_values, name)
+
+    response.headers['X-Log-Index'] = str(index)
+
+    return items
+
+
+@app.put("/snapshot", status_code=204)
+async def apply_snapshot(request: Request):
+    return await apply_log_snapshot(DataManager.DEFAULT_LOG, request)
+
+
+@app.put("/logs/{name}/snapshot", status_code=204)
+async def apply_log_snapshot(name: str, request: Request):
+    """Internal endpoint to receive a compressed snapshot chunk from the Master during bootstrap"""
+    payload = await request.body()
+
+    try:
+        await run_in_threadpool(get_data_manager_instance().apply_snapshot, payload, name)
+    except BaseException as err:
+        return JSONResponse(str(err), status_code=405)
+
+    return Response(status_code=204)
+
+
+@app.get("/logs/{name}/replicas", status_code=200)
+def get_log_replicas(name: str):
+    """Returns applied index and lag of every secondary for the log, can be used to route reads"""
+    return get_data_manager_instance().get_replicas_lag(name)
 
 
 @app.get("/heartbeat", status_code=200)
@@ -74,18 +205,143 @@ def get_data(response: Response):
     return get_data_manager_instance().get_heartbeat_status()
 
 
+@app.get("/replication", status_code=200)
+def get_replication_status():
+    """Technical endpoint to check replication queue depth on the Master"""
+    return get_data_manager_instance().get_replication_status()
+
+
 @app.post("/delay")
 def set_delay(inpt: DelayValue):
-    """Technical endpoint to imitate replication delay"""
-    app.delay = inpt.value
+    """Technical endpoint to imitate replication delay, a shortcut for one-time fault rule"""
+    if app.delay_rule_id is not None:
+        FaultInjector().remove_rule(app.delay_rule_id)
+        app.delay_rule_id = None
+
+    if inpt.value > 0:
+        app.delay_rule_id = FaultInjector().add_rule(
+            FaultRule(endpoint='PUT */message', latency_ms=inpt.value * 1000, count=1)
+        )
 
-    return {'delay': app.delay}
+    return get_delay()
 
 
 @app.get("/delay")
 def get_delay():
     """Technical endpoint to imitate delay on secondary instance"""
-    return {'delay': app.delay}
+    rule = FaultInjector().get_rule(app.delay_rule_id) if app.delay_rule_id is not None else None
+
+    return {'delay': int(rule.get_latency_ms() / 1000) if rule is not None else 0}
+
+
+@app.get("/admin/faults")
+def get_fault_rules():
+    """Technical endpoint to list active fault rules"""
+    return FaultInjector().get_rules()
+
+
+@app.post("/admin/faults", status_code=201)
+def add_fault_rule(inpt: FaultRuleValue):
+    """Technical endpoint to add fault rule for performance testing"""
+    try:
+        rule_id = FaultInjector().add_rule(FaultRule(**inpt.dict()))
+    except BaseException as err:
+        return JSONResponse(str(err), status_code=400)
+
+    return {'id': rule_id}
+
+
+@app.delete("/admin/faults/{rule_id}", status_code=204)
+def remove_fault_rule(rule_id: int):
+    if not FaultInjector().remove_rule(rule_id):
+        return JSONResponse('Fault rule not found', status_code=404)
+
+    return None
+
+
+@app.delete("/admin/faults", status_code=204)
+def clear_fault_rules():
+    FaultInjector().clear()
+
+    return None
+
+
+@app.get("/admin/profile")
+async def profile(seconds: float = 10, interval_ms: float = 5):
+    """
+    Technical endpoint to sample stacks of all threads for the provided number of seconds
+    Returns collapsed stacks that can be passed to flamegraph tools directly
+    """
+    if not 0 < seconds <= 300 or interval_ms < 1:
+        return JSONResponse('Profiling time should be in range (0, 300] seconds, interval at least 1 ms',
+                            status_code=400)
+
+    profiler = SamplingProfiler(interval_ms / 1000)
+
+    try:
+        profiler.start()
+    except SamplingProfilerBusyException as err:
+        return JSONResponse(str(err), status_code=409)
+
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.stop()
+
+    return PlainTextResponse(profiler.get_collapsed_stacks())
+
+
+@app.post("/admin/tracing")
+def set_tracing(inpt: TracingValue):
+    """Technical endpoint to enable or disable per-request trace spans"""
+    Tracer().set_enabled(inpt.enabled)
+
+    return {'enabled': Tracer().is_enabled()}
+
+
+@app.get("/admin/traces")
+def get_traces(limit: Union[int, None] = None):
+    """Technical endpoint to get the latest finished traces"""
+    return Tracer().get_traces(limit)
+
+
+@app.get("/admin/secondaries")
+def get_secondaries():
+    """Technical endpoint to list secondaries with their membership state"""
+    return get_data_manager_instance().get_secondaries()
+
+
+@app.post("/admin/secondaries", status_code=202)
+def add_secondary(inpt: SecondaryValue):
+    """Technical endpoint to register a new secondary at runtime, the bootstrap is running in background"""
+    try:
+        get_data_manager_instance().add_secondary(inpt.name, inpt.address)
+    except DataManagerSecondaryExistsException as err:
+        return JSONResponse(str(err), status_code=409)
+    except BaseException as err:
+        return JSONResponse(str(err), status_code=405)
+
+    return {'name': inpt.name, 'state': 'joining'}
+
+
+@app.post("/admin/secondaries/{name}/bootstrap", status_code=202)
+def bootstrap_secondary(name: str):
+    """Technical endpoint to stream the snapshot to an existing secondary again, e.g. after node replacement"""
+    try:
+        get_data_manager_instance().bootstrap_secondary(name)
+    except DataManagerSecondaryNotFoundException as err:
+        return JSONResponse(str(err), status_code=404)
+
+    return {'name': name}
+
+
+@app.delete("/admin/secondaries/{name}", status_code=204)
+def remove_secondary(name: str):
+    """Technical endpoint to remove a secondary added at runtime, both joining and member ones"""
+    try:
+        get_data_manager_instance().remove_secondary(name)
+    except DataManagerSecondaryNotFoundException as err:
+        return JSONResponse(str(err), status_code=404)
 
 
 if __name__ == "__main__":